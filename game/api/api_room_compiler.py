@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Room Bundle Compiler for Snatchernauts Framework
+Offline compiler that turns authored room data into pre-normalized bundles.
+
+Sources:
+  - rooms/<id>/<id>.yaml               (room_info + objects)
+  - rooms/<id>/scripts/<id>_config.rpy (define ROOM_DEFINITIONS_<ID> = {...})
+
+Every object is validated against OBJECT_SCHEMA, defaults are filled in,
+z is clamped and mapped to its layer bucket, and width/height are resolved
+from the image's pixel size and scale_percent. The result is written to
+rooms/<id>/<id>.bundle.json together with the SHA-1 of every source file and
+of every referenced image (sizes are baked from them; a missing image is
+recorded as null) so the runtime (core/core_room_bundles.rpy) can load it without any per-object
+fix-up and fall back to the authored data when a bundle is stale.
+
+Usage:
+    python game/api/api_room_compiler.py            # compile all rooms
+    python game/api/api_room_compiler.py --check    # validate only
+    python game/api/api_room_compiler.py room1      # compile one room
+"""
+
+import os
+import ast
+import sys
+import struct
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+BUNDLE_VERSION = 2
+BUNDLE_SUFFIX = ".bundle.json"
+
+# Mirrors z_to_bucket() / ensure_object_z_properties() in api/api_room.rpy
+Z_MIN, Z_MAX, Z_DEFAULT = 0, 50, 12
+Z_BUCKETS = ((16, "room_bg"), (33, "room_mid"), (Z_MAX, "room_fg"))
+
+OBJECT_TYPES = ("character", "item", "door", "container", "decoration")
+
+NUMBER = (int, float)
+
+# field -> (accepted types, default); REQUIRED marks mandatory fields
+REQUIRED = object()
+OBJECT_SCHEMA = {
+    "image": (str, REQUIRED),
+    "x": (NUMBER, 0),
+    "y": (NUMBER, 0),
+    "scale_percent": (NUMBER, 100),
+    "width": (NUMBER, None),
+    "height": (NUMBER, None),
+    "z": (NUMBER, Z_DEFAULT),
+    "description": (str, ""),
+    "object_type": (str, "item"),
+    "box_position": (str, "auto"),
+    "float_intensity": (NUMBER, None),
+    "light_affectable": (bool, True),
+    "interactions": (list, None),
+    "target_room": (str, None),
+}
+
+# Files whose `define`s feed .rpy room definitions, in Ren'Py init order
+RPY_DEFINE_SOURCES = (
+    "core/rooms/core_rooms_config.rpy",
+    "core/core_desaturation.rpy",
+)
+
+
+class Unresolved(object):
+    """Placeholder for names that only exist at runtime (callables, store)."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return "<runtime:{}>".format(self.name)
+
+
+class _DefineScope(dict):
+    def __missing__(self, key):
+        return Unresolved(key)
+
+
+def _merge_configs(*configs):
+    result = {}
+    for config in configs:
+        if isinstance(config, dict):
+            result.update(config)
+    return result
+
+
+def _builder_helpers(scope: Dict[str, Any]) -> Dict[str, Any]:
+    """Offline equivalents of core/core_config_builders.rpy."""
+
+    def create_object_config(base_config, overrides=None):
+        config = dict(base_config) if isinstance(base_config, dict) else {}
+        if overrides:
+            config.update(overrides)
+        return config
+
+    return {
+        "merge_configs": _merge_configs,
+        "create_object_config": create_object_config,
+        "create_desaturation_config": lambda overrides=None: create_object_config(scope.get("DEFAULT_DESATURATION_CONFIG"), overrides),
+        "create_bloom_config": lambda overrides=None: create_object_config(scope.get("DEFAULT_DESATURATION_CONFIG"), overrides),
+        "create_animation_config": lambda overrides=None: create_object_config(scope.get("DEFAULT_ANIMATION_CONFIG"), overrides),
+        "True": True, "False": False, "None": None,
+    }
+
+
+def iter_rpy_defines(text: str):
+    """Yield (name, expression source) for top-level `define NAME = expr` statements."""
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("define ") and "=" in line:
+            head, expr = line[len("define "):].split("=", 1)
+            name = head.strip()
+            j = i
+            while True:
+                try:
+                    ast.parse(expr.strip(), mode="eval")
+                    break
+                except SyntaxError:
+                    j += 1
+                    if j >= len(lines):
+                        expr = None
+                        break
+                    expr += "\n" + lines[j]
+            if expr is not None and name.isidentifier():
+                yield name, expr.strip()
+            i = j + 1
+            continue
+        i += 1
+
+
+def evaluate_rpy_defines(path: str, scope: Dict[str, Any], errors: List[str]) -> None:
+    """Evaluate a file's defines into scope; unknown names become Unresolved."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    for name, expr in iter_rpy_defines(text):
+        try:
+            scope[name] = eval(compile(expr, path, "eval"), {"__builtins__": {}}, scope)
+        except Exception as e:
+            scope[name] = Unresolved(name)
+            errors.append("{}: define {} could not be evaluated offline ({})".format(path, name, e))
+
+
+def image_size(path: str) -> Optional[Tuple[int, int]]:
+    """Pixel size of an image: PNG header first, Pillow as a fallback."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(24)
+        if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+    except OSError:
+        return None
+    try:
+        from PIL import Image
+        with Image.open(path) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def z_to_bucket(z: int) -> str:
+    for upper, bucket in Z_BUCKETS:
+        if z <= upper:
+            return bucket
+    return Z_BUCKETS[-1][1]
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def image_digest(path: str) -> Optional[str]:
+    """SHA-1 of an image file, or None when it does not exist."""
+    try:
+        return file_digest(path)
+    except OSError:
+        return None
+
+
+class RoomCompiler:
+    """Collects room sources under a game directory and emits bundles."""
+
+    def __init__(self, game_dir: str):
+        self.game_dir = os.path.abspath(game_dir)
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.original_sizes: Dict[str, Dict[str, int]] = {}
+
+    # -- sources -------------------------------------------------------------
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.game_dir).replace(os.sep, "/")
+
+    def collect_rooms(self) -> Dict[str, Dict[str, Any]]:
+        """room_id -> {"room": raw definition, "sources": [relative paths]}."""
+        rooms: Dict[str, Dict[str, Any]] = {}
+        rooms_dir = os.path.join(self.game_dir, "rooms")
+        if not os.path.isdir(rooms_dir):
+            return rooms
+
+        scope = _DefineScope()
+        scope.update(_builder_helpers(scope))
+        shared = []
+        for rel in RPY_DEFINE_SOURCES:
+            path = os.path.join(self.game_dir, rel)
+            if os.path.exists(path):
+                evaluate_rpy_defines(path, scope, self.warnings)
+                shared.append(rel)
+
+        for room_dir in sorted(os.listdir(rooms_dir)):
+            base = os.path.join(rooms_dir, room_dir)
+            if not os.path.isdir(base):
+                continue
+            config_rpy = os.path.join(base, "scripts", room_dir + "_config.rpy")
+            if os.path.exists(config_rpy):
+                before = set(scope.keys())
+                evaluate_rpy_defines(config_rpy, scope, self.warnings)
+                for name in set(scope.keys()) - before:
+                    value = scope[name]
+                    if name.startswith("ROOM_DEFINITIONS_") and isinstance(value, dict):
+                        for room_id, room in value.items():
+                            rooms[str(room_id)] = {"room": room, "sources": shared + [self._rel(config_rpy)]}
+
+            yaml_path = os.path.join(base, room_dir + ".yaml")
+            if os.path.exists(yaml_path):
+                room = self._load_yaml_room(yaml_path)
+                if room is not None:
+                    rooms[room_dir] = {"room": room, "sources": [self._rel(yaml_path)]}
+        return rooms
+
+    def _load_yaml_room(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            import yaml
+        except ImportError:
+            sys.path.insert(0, os.path.join(self.game_dir, "python-packages"))
+            import yaml
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+        except Exception as e:
+            self.errors.append("{}: YAML parse error: {}".format(self._rel(path), e))
+            return None
+        info = config.get("room_info", {}) or {}
+        room = {"background": info.get("background", ""), "objects": config.get("objects", {}) or {}}
+        if info.get("music"):
+            room["music"] = info["music"]
+        return room
+
+    # -- normalization -------------------------------------------------------
+
+    def _original_size(self, image: str) -> Optional[Tuple[int, int]]:
+        if image in self.original_sizes:
+            s = self.original_sizes[image]
+            return s["width"], s["height"]
+        size = image_size(os.path.join(self.game_dir, image))
+        if size:
+            self.original_sizes[image] = {"width": int(size[0]), "height": int(size[1])}
+        return size
+
+    def normalize_object(self, room_id: str, name: str, data: Any) -> Optional[Dict[str, Any]]:
+        where = "{}/{}".format(room_id, name)
+        if not isinstance(data, dict):
+            self.errors.append("{}: object must be a mapping".format(where))
+            return None
+        obj: Dict[str, Any] = {}
+        for key, value in data.items():
+            if isinstance(value, Unresolved):
+                self.warnings.append("{}: '{}' is runtime-only ({}) and was left out".format(where, key, value.name))
+                continue
+            obj[key] = value
+
+        for key, (types, default) in OBJECT_SCHEMA.items():
+            if key not in obj or obj[key] is None:
+                if default is REQUIRED:
+                    self.errors.append("{}: missing required field '{}'".format(where, key))
+                    return None
+                if default is not None:
+                    obj[key] = default
+                continue
+            if isinstance(obj[key], bool) and types is NUMBER:
+                self.errors.append("{}: '{}' must be a number".format(where, key))
+                return None
+            if not isinstance(obj[key], types):
+                self.errors.append("{}: '{}' has type {}".format(where, key, type(obj[key]).__name__))
+                return None
+
+        if obj["object_type"] not in OBJECT_TYPES:
+            self.warnings.append("{}: unknown object_type '{}'".format(where, obj["object_type"]))
+
+        z = int(obj["z"])
+        if not Z_MIN <= z <= Z_MAX:
+            self.warnings.append("{}: z={} clamped to {}..{}".format(where, z, Z_MIN, Z_MAX))
+        obj["z"] = max(Z_MIN, min(Z_MAX, z))
+        obj["layer"] = z_to_bucket(obj["z"])
+        obj.setdefault("id", name)
+
+        size = self._original_size(obj["image"])
+        if not obj.get("width") or not obj.get("height"):
+            if size is None:
+                self.errors.append("{}: image not found and no width/height: {}".format(where, obj["image"]))
+                return None
+            scale = float(obj["scale_percent"])
+            obj["width"] = obj.get("width") or int(size[0] * scale / 100)
+            obj["height"] = obj.get("height") or int(size[1] * scale / 100)
+        elif size is None:
+            self.warnings.append("{}: image not found: {}".format(where, obj["image"]))
+        for key in ("x", "y", "width", "height"):
+            obj[key] = int(obj[key])
+
+        for i, action in enumerate(obj.get("interactions") or []):
+            if not isinstance(action, dict) or "action" not in action:
+                self.errors.append("{}: interactions[{}] needs an 'action'".format(where, i))
+                return None
+            action.setdefault("label", str(action["action"]).replace("_", " ").title())
+        return obj
+
+    def compile_room(self, room_id: str, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        room = entry["room"]
+        errors_before = len(self.errors)
+        objects = {}
+        for name, data in (room.get("objects") or {}).items():
+            obj = self.normalize_object(room_id, str(name), data)
+            if obj is not None:
+                objects[str(name)] = obj
+        if len(self.errors) > errors_before:
+            return None
+
+        bundle: Dict[str, Any] = {
+            "version": BUNDLE_VERSION,
+            "room_id": room_id,
+            "background": room.get("background", "") if isinstance(room.get("background"), str) else "",
+            "objects": objects,
+            "sources": {rel: file_digest(os.path.join(self.game_dir, rel)) for rel in entry["sources"]},
+        }
+        for key in ("music", "ambient_channel"):
+            if isinstance(room.get(key), str):
+                bundle[key] = room[key]
+        images = [o["image"] for o in objects.values()]
+        if bundle["background"] and not bundle["background"].startswith("#"):
+            images.append(bundle["background"])
+            if self._original_size(bundle["background"]) is None:
+                self.warnings.append("{}: background not found: {}".format(room_id, bundle["background"]))
+        bundle["original_sizes"] = {img: self.original_sizes[img] for img in images if img in self.original_sizes}
+        # Baked width/height depend on the images too: a changed image makes the bundle stale
+        for img in images:
+            bundle["sources"].setdefault(img, image_digest(os.path.join(self.game_dir, img)))
+        return bundle
+
+    def bundle_path(self, room_id: str) -> str:
+        return os.path.join(self.game_dir, "rooms", room_id, room_id + BUNDLE_SUFFIX)
+
+    def run(self, room_ids: Optional[List[str]] = None, check_only: bool = False) -> int:
+        """Compile rooms; returns the number of bundles written (or validated)."""
+        rooms = self.collect_rooms()
+        count = 0
+        for room_id, entry in sorted(rooms.items()):
+            if room_ids and room_id not in room_ids:
+                continue
+            bundle = self.compile_room(room_id, entry)
+            if bundle is None:
+                continue
+            count += 1
+            if not check_only:
+                save_bundle(self.bundle_path(room_id), bundle)
+        return count
+
+
+def save_bundle(path: str, bundle: Dict[str, Any]) -> bool:
+    """Write a bundle through the JSON IO service (atomic, change-detected)."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import api_io_json
+    return api_io_json.save_json_if_changed(path, bundle)
+
+
+def main(argv: List[str]) -> int:
+    check_only = "--check" in argv
+    room_ids = [a for a in argv if not a.startswith("--")]
+    game_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    compiler = RoomCompiler(game_dir)
+    count = compiler.run(room_ids or None, check_only=check_only)
+    for w in compiler.warnings:
+        print("warning: " + w)
+    for e in compiler.errors:
+        print("error: " + e)
+    print("{} {} room bundle(s)".format("Validated" if check_only else "Compiled", count))
+    return 1 if compiler.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))